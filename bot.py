@@ -1,17 +1,26 @@
 #!/usr/bin/env python3
 import os
-import threading
+import re
 import asyncio
-import time
 import logging
-from typing import Optional, Tuple, Any, List
+from typing import Optional, Tuple, Any, List, Union
 from urllib.parse import quote, unquote
 
 import psycopg
-from flask import Flask
-from pyrogram import Client, filters
+from aiohttp import web
+from cachetools import TTLCache
+from psycopg_pool import AsyncConnectionPool
+from pyrogram import Client, filters, idle
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+try:
+    import uvloop
+except ImportError:  # not available on Windows; the stock loop works fine
+    pass
+else:
+    # Must run before the Client below grabs the event loop.
+    uvloop.install()
+
 # --------- Logging ----------
 logging.basicConfig(
     level=os.environ.get("LOG_LEVEL", "INFO"),
@@ -20,23 +29,19 @@ logging.basicConfig(
 logger = logging.getLogger("movie_bot")
 
 # ------------------ KEEP-ALIVE WEB SERVER ------------------
-flask_app = Flask("keepalive")
-
+async def index(request: web.Request) -> web.Response:
+    return web.Response(text="Movie Bot is alive!")
 
-@flask_app.route("/")
-def index():
-    return "Movie Bot is alive!"
 
-
-def run_keepalive(port: int = 8080):
+async def start_keepalive(port: int = 8080) -> web.AppRunner:
+    # Served from the bot's own event loop, so no extra thread is needed.
     logger.info("Starting keep-alive server on port %s", port)
-    flask_app.run(host="0.0.0.0", port=port, threaded=True)
-
-
-def start_keepalive_thread(port: int = 8080):
-    t = threading.Thread(target=run_keepalive, args=(port,), daemon=True)
-    t.start()
-    time.sleep(0.3)
+    app = web.Application()
+    app.router.add_get("/", index)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    return runner
 
 
 # ------------------ ENVIRONMENT ------------------
@@ -48,12 +53,17 @@ def require_env(name: str) -> str:
     return val
 
 
+def parse_chat_id(val: str) -> Union[int, str]:
+    # Numeric IDs (e.g. -100123...) must be ints for pyrogram; usernames stay strings.
+    return int(val) if val.lstrip("-").isdigit() else val
+
+
 API_ID = int(require_env("API_ID"))
 API_HASH = require_env("API_HASH")
 BOT_TOKEN = require_env("BOT_TOKEN")
 ADMIN_ID = int(require_env("ADMIN_ID"))
 DATABASE_URL = require_env("DATABASE_URL")
-SOURCE_CHANNEL = require_env("SOURCE_CHANNEL")  # private/public source channel ID or username
+SOURCE_CHANNEL = parse_chat_id(require_env("SOURCE_CHANNEL"))  # private/public source channel ID or username
 
 DEFAULT_CHANNELS = ["@ModMasterUnlocked", "@AnimeTheaterLeaks", "@hollywoodleaks711"]
 
@@ -66,19 +76,43 @@ DELETE_AFTER_SECONDS = int(os.environ.get("DELETE_AFTER_SECONDS", 20 * 60))
 PORT = int(os.environ.get("PORT", 8080))
 
 # ------------------ FANCY FONT ------------------
+_NORMAL = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+_FANCY_BOLD = (
+    "𝗮𝗯𝗰𝗱𝗲𝗳𝗴𝗵𝗶𝗷𝗸𝗹𝗺𝗻𝗼𝗽𝗾𝗿𝘀𝘁𝘂𝘃𝘄𝘅𝘆𝘇"
+    "𝗔𝗕𝗖𝗗𝗘𝗙𝗚𝗛𝗜𝗝𝗞𝗟𝗠𝗡𝗢𝗣𝗤𝗥𝗦𝗧𝗨𝗩𝗪𝗫𝗬𝗭"
+    "𝟬𝟭𝟮𝟯𝟰𝟱𝟲𝟳𝟴𝟵"
+)
+_FANCY_TABLE = str.maketrans(_NORMAL, _FANCY_BOLD)
+
+
 def fancy(text: str) -> str:
-    normal = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
-    fancy_bold = (
-        "𝗮𝗯𝗰𝗱𝗲𝗳𝗴𝗵𝗶𝗷𝗸𝗹𝗺𝗻𝗼𝗽𝗾𝗿𝘀𝘁𝘂𝘃𝘄𝘅𝘆𝘇"
-        "𝗔𝗕𝗖𝗗𝗘𝗙𝗚𝗛𝗜𝗝𝗞𝗟𝗠𝗡𝗢𝗣𝗤𝗥𝗦𝗧𝗨𝗩𝗪𝗫𝗬𝗭"
-        "𝟬𝟭𝟮𝟯𝟰𝟵"
-    )
-    table = str.maketrans(normal, fancy_bold)
-    return text.translate(table)
+    return text.translate(_FANCY_TABLE)
 
 
 # ------------------ DATABASE HELPERS ------------------
+# One async pool for the whole process: queries reuse open connections and run
+# directly on the event loop instead of hopping to a worker thread.
+# Opened in main().
+POOL = AsyncConnectionPool(
+    DATABASE_URL,
+    min_size=2,
+    max_size=int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+    check=AsyncConnectionPool.check_connection,
+    # Prepare statements on first use; pooled connections then reuse the plan.
+    kwargs={"prepare_threshold": 0},
+    open=False,
+)
+
+SQL_GET_MOVIES = """
+    SELECT file_id, cover_id
+    FROM movies
+    WHERE code = %s
+    ORDER BY file_id ASC;
+"""
+
+
 def db_connect():
+    # Only used for the one-shot schema setup; everything else goes through POOL.
     return psycopg.connect(DATABASE_URL)
 
 
@@ -103,45 +137,34 @@ def db_init():
         raise e
 
 
-def db_add_movie(code: str, file_id: str, cover_id: Optional[str], mode: str):
-    with db_connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO movies (code, file_id, cover_id, mode)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (code, file_id) DO NOTHING;
-            """, (code, file_id, cover_id, mode))
-        conn.commit()
-
-
-def db_get_movies(code: str) -> List[Tuple[str, str]]:
-    with db_connect() as conn:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT file_id, cover_id
-                FROM movies
-                WHERE code = %s
-                ORDER BY file_id ASC;
-            """, (code,))
-            return cur.fetchall()
-
-
-# Async wrappers
 async def async_db_init():
     await asyncio.to_thread(db_init)
 
 
 async def async_db_add_movie(code: str, file_id: str, cover_id: Optional[str], mode: str):
-    await asyncio.to_thread(db_add_movie, code, file_id, cover_id, mode)
+    async with POOL.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("""
+                INSERT INTO movies (code, file_id, cover_id, mode)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (code, file_id) DO NOTHING;
+            """, (code, file_id, cover_id, mode))
+        await conn.commit()
 
 
 async def async_db_get_movies(code: str) -> List[Tuple[str, str]]:
-    return await asyncio.to_thread(db_get_movies, code)
+    async with POOL.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(SQL_GET_MOVIES, (code,))
+            return await cur.fetchall()
 
 
 # ------------------ Pyrogram client ------------------
 bot = Client("movie_bot", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
-_pending_adds: dict[int, dict] = {}
+# Unfinished /addmovie flows per admin; abandoned ones expire after 10 minutes.
+_pending_adds: TTLCache = TTLCache(maxsize=64, ttl=600)
+BOT_USERNAME: Optional[str] = None  # filled in once by main() after bot.start()
+_SET_MODE_RE = re.compile(r"^set_mode_")
 
 
 # UPGRADE 1: Allow /addmovie directly in source channel or private
@@ -171,15 +194,20 @@ async def cmd_addmovie(client: Client, message):
         [InlineKeyboardButton(fancy("📺 Series"), callback_data=f"set_mode_series_{code}")],
     ]
     await message.reply_text(fancy("🎬 Is this a single movie or a series?"), reply_markup=InlineKeyboardMarkup(buttons))
-    _pending_adds[message.from_user.id] = {"code": code, "file_id": file_id, "timestamp": time.time()}
+    _pending_adds[message.from_user.id] = {"code": code, "file_id": file_id}
 
 
-@bot.on_callback_query(filters.regex(r"^set_mode_"))
+@bot.on_callback_query(filters.regex(_SET_MODE_RE))
 async def set_mode(client: Client, callback_query):
-    mode = callback_query.data.split("_")[2]
-    code = callback_query.data.split("_")[3]
+    # Codes may contain underscores, so only split off the mode.
+    mode, code = callback_query.data.removeprefix("set_mode_").split("_", 1)
 
-    _pending_adds[callback_query.from_user.id]["mode"] = mode
+    pending = _pending_adds.get(callback_query.from_user.id)
+    if pending is None or pending["code"] != code:
+        await callback_query.answer("This request has expired. Run /addmovie again.", show_alert=True)
+        return
+
+    pending["mode"] = mode
     await callback_query.answer(f"Mode set to {mode}")
 
     if mode == "series":
@@ -191,19 +219,19 @@ async def set_mode(client: Client, callback_query):
 @bot.on_message(filters.photo & filters.user(ADMIN_ID))
 async def receive_cover(client: Client, message):
     admin_id = message.from_user.id
-    if admin_id not in _pending_adds:
+    pending = _pending_adds.get(admin_id)
+    if pending is None or "mode" not in pending:
         return
 
-    code = _pending_adds[admin_id]["code"]
-    file_id = _pending_adds[admin_id]["file_id"]
+    code = pending["code"]
+    file_id = pending["file_id"]
     cover_id = message.photo.file_id
-    mode = _pending_adds[admin_id]["mode"]
+    mode = pending["mode"]
 
     try:
         await async_db_add_movie(code, file_id, cover_id if mode == "single" else None, mode)
-        del _pending_adds[admin_id]
-        me = await bot.get_me()
-        link = f"https://t.me/{me.username}?start={quote(code)}"
+        _pending_adds.pop(admin_id, None)
+        link = f"https://t.me/{BOT_USERNAME}?start={quote(code)}"
         await message.reply_text(f"{fancy('✅ Movie saved!')}\n{fancy('🎯 Share link:')}\n{link}", quote=True)
 
         if mode == "series":
@@ -213,16 +241,26 @@ async def receive_cover(client: Client, message):
         await message.reply_text(fancy("❌ Failed to save movie, check logs."), quote=True)
 
 
-# ------------------ Add a delay for time sync ------------------
-import time
-time.sleep(20)  # Wait for 20 seconds to synchronize time
-
 # ------------------ Start the bot ------------------
-if __name__ == "__main__":
-    start_keepalive_thread(port=PORT)
-    loop = asyncio.get_event_loop()
+async def main():
+    global BOT_USERNAME
+    runner = await start_keepalive(port=PORT)
+    # Opened regardless of db_init: with wait=False the pool keeps retrying in
+    # the background, so the bot recovers once the database is reachable.
+    await POOL.open()
     try:
-        loop.run_until_complete(async_db_init())
+        await async_db_init()
     except Exception:
         logger.exception("Database initialization failed at startup.")
-    bot.run()
+    await bot.start()
+    BOT_USERNAME = (await bot.get_me()).username
+    try:
+        await idle()
+    finally:
+        await bot.stop()
+        await POOL.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.get_event_loop().run_until_complete(main())